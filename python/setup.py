@@ -15,9 +15,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import os.path
+import sys
 
 from setuptools import setup, find_packages
+from setuptools.command.build_ext import build_ext
+from distutils import log
+from distutils.errors import CCompilerError, DistutilsExecError, \
+    DistutilsPlatformError
 
+from platform import python_implementation
 from sys import version_info, platform
 
 if version_info[:2] > (2, 5):
@@ -42,12 +48,57 @@ if setup_dir == '':
 base_dir = os.path.relpath(os.path.normpath(setup_dir), os.getcwd())
 src_dir = os.path.normpath(os.path.join(base_dir, 'src'))
 
+# If Cython is available, compile the hottest (de)serialization modules into
+# extension modules when building or installing. The pure python sources are
+# still installed, so the package keeps working wherever the extensions are
+# not built, including when no C compiler is available. Set CM_API_NO_CYTHON
+# in the environment to skip the compilation. Extensions are never built on
+# PyPy, whose JIT runs the pure python code faster.
+BUILD_COMMANDS = set(['build', 'build_ext', 'install', 'bdist', 'bdist_egg',
+    'bdist_wheel', 'develop'])
+
+class optional_build_ext(build_ext):
+  """
+  Builds the extension modules, falling back to the pure python modules
+  when they cannot be compiled.
+  """
+  def run(self):
+    try:
+      build_ext.run(self)
+    except DistutilsPlatformError as e:
+      self._skip(e)
+
+  def build_extension(self, ext):
+    try:
+      build_ext.build_extension(self, ext)
+    except (CCompilerError, DistutilsExecError, DistutilsPlatformError) as e:
+      self._skip(e, ext.name)
+
+  def _skip(self, e, name='extensions'):
+    log.warn("WARNING: could not compile %s (%s); using the pure python "
+             "modules instead." % (name, e))
+
+ext_modules = []
+if not os.environ.get('CM_API_NO_CYTHON') and \
+    python_implementation() != 'PyPy' and \
+    BUILD_COMMANDS.intersection(sys.argv[1:]):
+  try:
+    from Cython.Build import cythonize
+    ext_modules = cythonize(
+        [ os.path.join(src_dir, 'cm_api', 'endpoints', mod + '.py')
+          for mod in ('types', 'roles', 'role_config_groups') ],
+        compiler_directives={ 'language_level' : 2 }, quiet=True)
+  except ImportError:
+    pass
+
 setup(
   name = 'cm_api',
   version = '16.0.0',    # Compatible with API v16 (CM 5.11)
   packages = find_packages(src_dir, exclude=['cm_api_tests']),
   package_dir = {'': src_dir },
-  zip_safe = True,
+  ext_modules = ext_modules,
+  cmdclass = { 'build_ext' : optional_build_ext },
+  zip_safe = not ext_modules,
 
   # Project uses simplejson, so ensure that it gets installed or upgraded
   # on the target machine
@@ -14,23 +14,66 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
+
 from cm_api.endpoints.types import *
 from cm_api.endpoints.roles import ApiRole
+from cm_api.http_client import RestException
+from cm_api.resource import HTTP_UNSUPPORTED_MEDIA_TYPE
+
+# Large config payloads can optionally travel as CBOR, which is smaller than
+# JSON. This is only used when the caller sets supports_cbor on the resource.
+try:
+  import cbor2
+except ImportError:
+  cbor2 = None
+
+CBOR_CONTENT_TYPE = "application/cbor"
+_CBOR_ACCEPT = { 'Accept' : 'application/cbor, application/json;q=0.9' }
 
 __docformat__ = "epytext"
 
 ROLE_CONFIG_GROUPS_PATH = "/clusters/%s/services/%s/roleConfigGroups"
+ROLE_CONFIG_GROUP_PATH = ROLE_CONFIG_GROUPS_PATH + "/%s"
 CM_ROLE_CONFIG_GROUPS_PATH = "/cm/service/roleConfigGroups"
+CM_ROLE_CONFIG_GROUP_PATH = CM_ROLE_CONFIG_GROUPS_PATH + "/%s"
+
+# Shared query parameters for the config views; never modified.
+_FULL_PARAMS = { 'view' : 'full' }
+_SUMMARY_PARAMS = { 'view' : 'summary' }
 
+_PATH_CACHE_SIZE = 1024
+
+def _memoize_path(func):
+  """
+  Caches the paths built by the decorated function. The cache is dropped
+  whenever it grows past _PATH_CACHE_SIZE entries.
+  """
+  cache = { }
+  @functools.wraps(func)
+  def wrapper(*args):
+    try:
+      return cache[args]
+    except KeyError:
+      if len(cache) >= _PATH_CACHE_SIZE:
+        cache.clear()
+      path = cache[args] = func(*args)
+      return path
+  return wrapper
+
+@_memoize_path
 def _get_role_config_groups_path(cluster_name, service_name):
   if cluster_name:
     return ROLE_CONFIG_GROUPS_PATH % (cluster_name, service_name)
   else:
     return CM_ROLE_CONFIG_GROUPS_PATH
 
+@_memoize_path
 def _get_role_config_group_path(cluster_name, service_name, name):
-  path = _get_role_config_groups_path(cluster_name, service_name)
-  return "%s/%s" % (path, name)
+  if cluster_name:
+    return ROLE_CONFIG_GROUP_PATH % (cluster_name, service_name, name)
+  else:
+    return CM_ROLE_CONFIG_GROUP_PATH % (name,)
 
 def create_role_config_groups(resource_root, service_name, apigroup_list,
     cluster_name="default"):
@@ -43,6 +86,8 @@ def create_role_config_groups(resource_root, service_name, apigroup_list,
   @return: New ApiRoleConfigGroup object.
   @since: API v3
   """
+  if not apigroup_list:
+    return ApiList([])
   return call(resource_root.post,
       _get_role_config_groups_path(cluster_name, service_name),
       ApiRoleConfigGroup, True, data=apigroup_list, api_version=3)
@@ -59,9 +104,14 @@ def create_role_config_group(resource_root, service_name, name, display_name,
   @param cluster_name: Cluster name.
   @return: List of created role config groups.
   """
+  check_api_version(resource_root, 3)
   apigroup = ApiRoleConfigGroup(resource_root, name, display_name, role_type)
-  return create_role_config_groups(resource_root, service_name, [apigroup],
-      cluster_name)[0]
+  # Build the single-item list body directly instead of going through ApiList.
+  body = json.dumps({ ApiList.LIST_KEY : [ apigroup.to_json_dict() ] })
+  resp = resource_root.post(
+      _get_role_config_groups_path(cluster_name, service_name), data=body)
+  return ApiRoleConfigGroup.from_json_dict(resp[ApiList.LIST_KEY][0],
+      resource_root)
 
 def get_role_config_group(resource_root, service_name, name,
     cluster_name="default"):
@@ -76,6 +126,26 @@ def get_role_config_group(resource_root, service_name, name,
   return _get_role_config_group(resource_root, _get_role_config_group_path(
       cluster_name, service_name, name))
 
+def get_role_config_groups(resource_root, service_name, names,
+    cluster_name="default"):
+  """
+  Find several role config groups by name, using a single request.
+
+  For a single group, get_role_config_group() is cheaper.
+
+  @param resource_root: The root Resource object.
+  @param service_name: Service name.
+  @param names: Role config group names.
+  @param cluster_name: Cluster name.
+  @return: A list of ApiRoleConfigGroup objects, in the order of 'names'.
+  @raise KeyError: If one of the groups does not exist.
+  @since: API v3
+  """
+  groups = get_all_role_config_groups(resource_root, service_name,
+      cluster_name)
+  by_name = dict((g.name, g) for g in groups)
+  return [ by_name[n] for n in names ]
+
 def _get_role_config_group(resource_root, path):
   return call(resource_root.get, path, ApiRoleConfigGroup, api_version=3)
 
@@ -93,6 +163,51 @@ def get_all_role_config_groups(resource_root, service_name,
       _get_role_config_groups_path(cluster_name, service_name),
       ApiRoleConfigGroup, True, api_version=3)
 
+def _get_role_config_group_dicts(resource_root, service_name, cluster_name):
+  """
+  Returns the decoded JSON of all role config groups in the service.
+  """
+  check_api_version(resource_root, 3)
+  resp = resource_root.get(
+      _get_role_config_groups_path(cluster_name, service_name))
+  return resp[ApiList.LIST_KEY]
+
+def get_all_role_config_groups_fast(resource_root, service_name,
+    cluster_name="default"):
+  """
+  Same as get_all_role_config_groups(), but decodes the groups with
+  ApiRoleConfigGroup.from_json_dict_fast().
+
+  @param resource_root: The root Resource object.
+  @param service_name: Service name.
+  @param cluster_name: Cluster name.
+  @return: A list of ApiRoleConfigGroup objects.
+  @since: API v3
+  """
+  items = _get_role_config_group_dicts(resource_root, service_name,
+      cluster_name)
+  return ApiList([ ApiRoleConfigGroup.from_json_dict_fast(x, resource_root)
+      for x in items ])
+
+def iter_all_role_config_groups(resource_root, service_name,
+    cluster_name="default"):
+  """
+  Iterate over all role config groups in the specified service.
+
+  Unlike get_all_role_config_groups(), the ApiRoleConfigGroup objects are
+  created one at a time as the caller consumes them.
+
+  @param resource_root: The root Resource object.
+  @param service_name: Service name.
+  @param cluster_name: Cluster name.
+  @return: A generator of ApiRoleConfigGroup objects.
+  @since: API v3
+  """
+  # Fetch eagerly, so that errors are raised here rather than on first use.
+  items = _get_role_config_group_dicts(resource_root, service_name,
+      cluster_name)
+  return (ApiRoleConfigGroup.from_json_dict(x, resource_root) for x in items)
+
 def update_role_config_group(resource_root, service_name, name, apigroup,
     cluster_name="default"):
   """
@@ -124,6 +239,14 @@ def delete_role_config_group(resource_root, service_name, name,
       _get_role_config_group_path(cluster_name, service_name, name),
       ApiRoleConfigGroup, api_version=3)
 
+def _role_names_body(role_names):
+  """
+  Builds the ApiList payload for a list of role names. Names are plain
+  strings, so they are put in the body as-is instead of being converted
+  one by one.
+  """
+  return { ApiList.LIST_KEY : list(role_names) }
+
 def move_roles(resource_root, service_name, name, role_names,
     cluster_name="default"):
   """
@@ -134,13 +257,81 @@ def move_roles(resource_root, service_name, name, role_names,
   must match the role type of the roles.
 
   @param name: The name of the group the roles will be moved to.
-  @param role_names: The names of the roles to move.
+  @param role_names: The names of the roles to move (any iterable).
   @return: List of roles which have been moved successfully.
   @since: API v3
   """
+  body = _role_names_body(role_names)
+  if not body[ApiList.LIST_KEY]:
+    return ApiList([])
   return call(resource_root.put,
       _get_role_config_group_path(cluster_name, service_name, name) + '/roles',
-      ApiRole, True, data=role_names, api_version=3)
+      ApiRole, True, data=body, api_version=3, compress=True)
+
+class MoveRolesBulkError(Exception):
+  """
+  Raised by move_roles_bulk() when some of the moves failed. Moves to the
+  other groups have been applied, and are not rolled back.
+
+  @ivar moved: Dictionary mapping each group whose move succeeded to the
+               list of roles moved there.
+  @ivar errors: Dictionary mapping each group whose move failed to the
+                exception raised.
+  """
+  def __init__(self, moved, errors):
+    Exception.__init__(self, "Failed to move roles to %s" %
+        (", ".join(sorted(errors)),))
+    self.moved = moved
+    self.errors = errors
+
+def move_roles_bulk(resource_root, service_name, moves, cluster_name="default",
+    max_workers=16):
+  """
+  Moves roles to several role config groups, issuing one request per
+  destination group in parallel.
+
+  Every move is attempted even if some fail. In that case, the moves that
+  succeeded are not rolled back, and a MoveRolesBulkError reports which
+  groups succeeded and which failed.
+
+  @param moves: Dictionary (or list of pairs) mapping the name of each
+                destination group to the names of the roles to move there.
+  @param max_workers: Maximum number of concurrent requests (at least 1).
+  @return: List of roles which have been moved successfully.
+  @raise MoveRolesBulkError: If any of the moves failed.
+  @since: API v3
+  """
+  if max_workers < 1:
+    raise ValueError("max_workers must be at least 1, got %s" % (max_workers,))
+  if hasattr(moves, 'items'):
+    moves = moves.items()
+  moves = list(moves)
+
+  def move(item):
+    name, role_names = item
+    try:
+      return name, move_roles(resource_root, service_name, name, role_names,
+          cluster_name), None
+    except Exception, ex:
+      return name, None, ex
+
+  if len(moves) <= 1 or max_workers == 1:
+    results = [ move(item) for item in moves ]
+  else:
+    # Imported here so that only callers of this function load multiprocessing.
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(min(max_workers, len(moves)))
+    try:
+      results = pool.map(move, moves)
+    finally:
+      pool.close()
+      pool.join()
+
+  errors = dict((name, ex) for name, roles, ex in results if ex is not None)
+  if errors:
+    moved = dict((name, roles) for name, roles, ex in results if ex is None)
+    raise MoveRolesBulkError(moved, errors)
+  return ApiList([ role for name, roles, ex in results for role in roles ])
 
 def move_roles_to_base_role_config_group(resource_root, service_name,
      role_names, cluster_name="default"):
@@ -151,13 +342,16 @@ def move_roles_to_base_role_config_group(resource_root, service_name,
   service. The role type of the roles may vary. Each role will be moved to
   its corresponding base group depending on its role type.
 
-  @param role_names: The names of the roles to move.
+  @param role_names: The names of the roles to move (any iterable).
   @return: List of roles which have been moved successfully.
   @since: API v3
   """
+  body = _role_names_body(role_names)
+  if not body[ApiList.LIST_KEY]:
+    return ApiList([])
   return call(resource_root.put,
       _get_role_config_groups_path(cluster_name, service_name) + '/roles',
-      ApiRole, True, data=role_names, api_version=3)
+      ApiRole, True, data=body, api_version=3, compress=True)
 
 
 class ApiRoleConfigGroup(BaseApiResource):
@@ -178,7 +372,32 @@ class ApiRoleConfigGroup(BaseApiResource):
 
   def __init__(self, resource_root, name=None, displayName=None, roleType=None,
       config=None):
-    BaseApiObject.init(self, resource_root, locals())
+    # Pass the attributes explicitly rather than through locals(), which is
+    # slow when decoding large lists of groups.
+    BaseApiObject.__init__(self, resource_root, name=name,
+        displayName=displayName, roleType=roleType, config=config)
+
+  @classmethod
+  def from_json_dict_fast(cls, dic, resource_root):
+    """
+    Same as from_json_dict(), but skips the per-attribute validation, which
+    data coming from the server does not need. Attributes with a declared
+    type are still converted. Falls back to from_json_dict() if the data has
+    unknown attributes.
+    """
+    attrs = cls._get_attributes()
+    for name in dic:
+      if name not in attrs:
+        return cls.from_json_dict(dic, resource_root)
+    obj = cls.__new__(cls)
+    obj_dict = obj.__dict__
+    obj_dict['_resource_root'] = resource_root
+    for name, attr in attrs.iteritems():
+      value = dic.get(name)
+      if attr and value is not None:
+        value = attr.from_json(resource_root, value)
+      obj_dict[name] = value
+    return obj
 
   def __str__(self):
     return "<ApiRoleConfigGroup>: %s (cluster: %s; service: %s)" % (
@@ -202,9 +421,19 @@ class ApiRoleConfigGroup(BaseApiResource):
     @param view: View to materialize ('full' or 'summary').
     @return: Dictionary with configuration data.
     """
+    if view == 'full':
+      params = _FULL_PARAMS
+    elif view == 'summary':
+      params = _SUMMARY_PARAMS
+    else:
+      params = view and dict(view=view) or None
+    headers = None
+    if cbor2 is not None and view == 'full':
+      # The resource decodes either format the server chooses to answer with.
+      headers = _CBOR_ACCEPT
     path = self._path() + '/config'
-    resp = self._get_resource_root().get(path,
-        params = view and dict(view=view) or None)
+    resp = self._get_resource_root().get(path, params = params,
+        headers = headers)
     return json_to_config(resp, view == 'full')
 
   def update_config(self, config):
@@ -215,7 +444,21 @@ class ApiRoleConfigGroup(BaseApiResource):
     @return: Dictionary with updated configuration.
     """
     path = self._path() + '/config'
-    resp = self._get_resource_root().put(path, data = config_to_json(config))
+    root = self._get_resource_root()
+    data = config_to_api_list(config)
+    headers = cbor2 is not None and _CBOR_ACCEPT or None
+    if cbor2 is not None and root.supports_cbor:
+      # Not compressed, so that a 415 can only be about the CBOR body.
+      try:
+        resp = root.put(path, data = cbor2.dumps(data),
+            contenttype = CBOR_CONTENT_TYPE, headers = headers)
+        return json_to_config(resp)
+      except RestException, ex:
+        if ex.code != HTTP_UNSUPPORTED_MEDIA_TYPE:
+          raise
+        root.supports_cbor = False
+    resp = root.put(path, data = json.dumps(data), headers = headers,
+        compress = True)
     return json_to_config(resp)
 
   def get_all_roles(self):
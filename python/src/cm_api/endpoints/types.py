@@ -117,7 +117,7 @@ def check_api_version(resource_root, min_version):
 
 
 def call(method, path, ret_type,
-    ret_is_list=False, data=None, params=None, api_version=1):
+    ret_is_list=False, data=None, params=None, api_version=1, compress=False):
   """
   Generic function for calling a resource method and automatically dealing with
   serialization of parameters and deserialization of return values.
@@ -130,11 +130,15 @@ def call(method, path, ret_type,
   @param data: Optional data to send as payload to the call.
   @param params: Optional query parameters for the call.
   @param api_version: minimum API version for the call.
+  @param compress: whether to gzip a large payload (see Resource.supports_gzip).
   """
   check_api_version(method.im_self, api_version)
   if data is not None:
     data = json.dumps(Attr(is_api_list=True).to_json(data, False))
-    ret = method(path, data=data, params=params)
+    if compress:
+      ret = method(path, data=data, params=params, compress=True)
+    else:
+      ret = method(path, data=data, params=params)
   else:
     ret = method(path, params=params)
   if ret_type is None:
@@ -1115,7 +1119,7 @@ class ApiImpalaQueryAttribute(BaseApiObject):
   }
 
   def __str__(self):
-    return "<ApiImpalaQueryAttribute> %s" % name
+    return "<ApiImpalaQueryAttribute> %s" % self.name
 
 class ApiMr2AppInformation(BaseApiObject):
   _ATTRIBUTES = {
@@ -1179,7 +1183,7 @@ class ApiYarnApplicationAttribute(BaseApiObject):
   }
 
   def __str__(self):
-    return "<ApiYarnApplicationAttribute> %s" % name
+    return "<ApiYarnApplicationAttribute> %s" % self.name
 
 class ApiTimeSeriesRequest(BaseApiObject):
   _ATTRIBUTES = {
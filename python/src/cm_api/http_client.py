@@ -16,10 +16,12 @@
 
 import os
 import cookielib
+import gzip
 import logging
 import posixpath
 import types
 import urllib
+from StringIO import StringIO
 
 try:
   import socks
@@ -104,11 +106,13 @@ class HttpClient(object):
       self._opener = urllib2.build_opener(
           urllib2.HTTPSHandler(context=ssl_context),
           HTTPErrorProcessor(),
+          GzipProcessor(),
           urllib2.HTTPCookieProcessor(cookiejar),
           authhandler)
     else:
       self._opener = urllib2.build_opener(
           HTTPErrorProcessor(),
+          GzipProcessor(),
           urllib2.HTTPCookieProcessor(cookiejar),
           authhandler)
 
@@ -204,6 +208,31 @@ class HTTPErrorProcessor(urllib2.HTTPErrorProcessor):
 
   https_response = http_response
 
+class GzipProcessor(urllib2.BaseHandler):
+  """
+  Asks the server for gzip-compressed responses, and transparently
+  decompresses them. Runs before HTTPErrorProcessor so that error bodies
+  are decompressed too.
+  """
+  handler_order = 900
+
+  def http_request(self, request):
+    if not request.has_header('Accept-encoding'):
+      request.add_unredirected_header('Accept-Encoding', 'gzip')
+    return request
+
+  def http_response(self, request, response):
+    if response.info().get('Content-Encoding') != 'gzip':
+      return response
+    body = gzip.GzipFile(fileobj=StringIO(response.read())).read()
+    res = urllib.addinfourl(StringIO(body), response.info(), response.geturl(),
+        response.code)
+    res.msg = response.msg
+    return res
+
+  https_request = http_request
+  https_response = http_response
+
 #
 # Method copied from Django
 #
@@ -19,6 +19,7 @@ try:
   import json
 except ImportError:
   import simplejson as json
+import gzip
 import logging
 import posixpath
 import time
@@ -33,9 +34,21 @@ try:
 except ImportError:
   pass
 import urllib2
+from StringIO import StringIO
+from cm_api.http_client import RestException
+try:
+  import cbor2
+except ImportError:
+  cbor2 = None
 
 LOG = logging.getLogger(__name__)
 
+# Request bodies larger than this are gzip-compressed, when requested and if
+# the server supports it.
+GZIP_MIN_SIZE = 4096
+# Status with which a server rejects a request body encoding it cannot decode.
+HTTP_UNSUPPORTED_MEDIA_TYPE = 415
+
 
 class Resource(object):
   """
@@ -50,6 +63,12 @@ class Resource(object):
     self._path = relpath.strip('/')
     self.retries = 3
     self.retry_sleep = 3
+    # Set by the caller when the server is known to accept CBOR request
+    # bodies. Cleared if the server rejects a CBOR body.
+    self.supports_cbor = False
+    # Set by the caller when the server is known to accept gzip-compressed
+    # request bodies. Cleared if the server rejects a compressed body.
+    self.supports_gzip = False
 
   @property
   def base_url(self):
@@ -63,7 +82,8 @@ class Resource(object):
   def invoke(self, method, relpath=None, params=None, data=None, headers=None):
     """
     Invoke an API method.
-    @return: Raw body or JSON dictionary (if response content type is JSON).
+    @return: Raw body or decoded dictionary (if response content type is JSON,
+             or CBOR and cbor2 is installed).
     """
     path = self._join_uri(relpath)
     resp = self._client.execute(method,
@@ -91,15 +111,20 @@ class Resource(object):
       except Exception, ex:
         self._client.logger.exception('JSON decode error: %s' % (body,))
         raise ex
+    elif cbor2 is not None and len(body) != 0 and \
+          resp.info().getmaintype() == "application" and \
+          resp.info().getsubtype() == "cbor":
+      return cbor2.loads(body)
     else:
       return body
 
 
-  def get(self, relpath=None, params=None):
+  def get(self, relpath=None, params=None, headers=None):
     """
     Invoke the GET method on a resource.
     @param relpath: Optional. A relative path to this resource's path.
     @param params: Key-value data.
+    @param headers: Optional. Extra request headers.
 
     @return: A dictionary of the JSON result.
     """
@@ -107,7 +132,7 @@ class Resource(object):
       if retry:
         time.sleep(self.retry_sleep)
       try:
-        return self.invoke("GET", relpath, params)
+        return self.invoke("GET", relpath, params, headers=headers)
       except (socket.error, urllib2.URLError) as e:
         if "timed out" in str(e).lower():
           log_message = "Timeout issuing GET request for %s." \
@@ -134,35 +159,67 @@ class Resource(object):
     return self.invoke("DELETE", relpath, params)
 
 
-  def post(self, relpath=None, params=None, data=None, contenttype=None):
+  def post(self, relpath=None, params=None, data=None, contenttype=None,
+      headers=None, compress=False):
     """
     Invoke the POST method on a resource.
     @param relpath: Optional. A relative path to this resource's path.
     @param params: Key-value data.
     @param data: Optional. Body of the request.
     @param contenttype: Optional.
+    @param headers: Optional. Extra request headers.
+    @param compress: Optional. Gzip large bodies, if supports_gzip is set.
 
     @return: A dictionary of the JSON result.
     """
-    return self.invoke("POST", relpath, params, data,
-                       self._make_headers(contenttype))
+    return self._send("POST", relpath, params, data,
+                      self._make_headers(contenttype, headers), compress)
 
 
-  def put(self, relpath=None, params=None, data=None, contenttype=None):
+  def put(self, relpath=None, params=None, data=None, contenttype=None,
+      headers=None, compress=False):
     """
     Invoke the PUT method on a resource.
     @param relpath: Optional. A relative path to this resource's path.
     @param params: Key-value data.
     @param data: Optional. Body of the request.
     @param contenttype: Optional.
+    @param headers: Optional. Extra request headers.
+    @param compress: Optional. Gzip large bodies, if supports_gzip is set.
 
     @return: A dictionary of the JSON result.
     """
-    return self.invoke("PUT", relpath, params, data,
-                       self._make_headers(contenttype))
+    return self._send("PUT", relpath, params, data,
+                      self._make_headers(contenttype, headers), compress)
 
 
-  def _make_headers(self, contenttype=None):
+  def _send(self, method, relpath, params, data, headers, compress):
+    if compress and self.supports_gzip and data is not None and \
+        len(data) > GZIP_MIN_SIZE:
+      gz_headers = dict(headers or { })
+      gz_headers['Content-Encoding'] = 'gzip'
+      try:
+        return self.invoke(method, relpath, params, _gzip(data), gz_headers)
+      except RestException, ex:
+        if ex.code != HTTP_UNSUPPORTED_MEDIA_TYPE:
+          raise
+        LOG.warn("%s %s: compressed body rejected; resending uncompressed" %
+            (method, relpath))
+        self.supports_gzip = False
+    return self.invoke(method, relpath, params, data, headers)
+
+  def _make_headers(self, contenttype=None, headers=None):
+    res = dict(headers or { })
     if contenttype:
-      return { 'Content-Type': contenttype }
-    return None
+      res['Content-Type'] = contenttype
+    return res or None
+
+
+def _gzip(data):
+  buf = StringIO()
+  gz = gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=1)
+  try:
+    gz.write(data)
+  finally:
+    gz.close()
+  return buf.getvalue()
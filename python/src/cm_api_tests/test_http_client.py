@@ -0,0 +1,55 @@
+# Licensed to Cloudera, Inc. under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  Cloudera, Inc. licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import mimetools
+import unittest
+import urllib
+import urllib2
+from StringIO import StringIO
+from cm_api.http_client import GzipProcessor
+
+class TestGzipProcessor(unittest.TestCase):
+
+  def _response(self, body, headers):
+    hdrs = mimetools.Message(StringIO(headers))
+    res = urllib.addinfourl(StringIO(body), hdrs, 'http://localhost/', 200)
+    res.msg = 'OK'
+    return res
+
+  def test_request(self):
+    req = GzipProcessor().http_request(urllib2.Request('http://localhost/'))
+    self.assertEqual('gzip', req.unredirected_hdrs['Accept-encoding'])
+
+  def test_response(self):
+    buf = StringIO()
+    f = gzip.GzipFile(fileobj=buf, mode='wb')
+    f.write('{"items": []}')
+    f.close()
+
+    proc = GzipProcessor()
+    res = proc.http_response(None, self._response(buf.getvalue(),
+        'Content-Type: application/json\r\nContent-Encoding: gzip\r\n\r\n'))
+    self.assertEqual('{"items": []}', res.read())
+    self.assertEqual(200, res.code)
+    self.assertEqual('json', res.info().getsubtype())
+
+    res = proc.http_response(None, self._response('plain',
+        'Content-Type: text/plain\r\n\r\n'))
+    self.assertEqual('plain', res.read())
+
+if __name__ == '__main__':
+  unittest.main()
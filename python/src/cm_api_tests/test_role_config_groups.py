@@ -0,0 +1,409 @@
+# Licensed to Cloudera, Inc. under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  Cloudera, Inc. licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import logging
+import mimetools
+import threading
+import unittest
+import urllib
+import urllib2
+from StringIO import StringIO
+from cm_api.http_client import RestException
+from cm_api.resource import Resource
+from cm_api.endpoints import role_config_groups
+from cm_api.endpoints.role_config_groups import *
+from cm_api.endpoints.roles import ApiRole
+from cm_api.endpoints.types import *
+from cm_api_tests import utils
+
+class PathMockResource(utils.MockResource):
+  """
+  Returns canned data (or raises a canned exception) based on the request
+  path; safe to use from several threads.
+  """
+
+  def __init__(self, test, responses):
+    utils.MockResource.__init__(self, test)
+    self._responses = responses
+    self._lock = threading.Lock()
+    self.requests = [ ]
+
+  def invoke(self, method, relpath=None, params=None, data=None, headers=None):
+    self._lock.acquire()
+    try:
+      self.requests.append((method, relpath, data, headers))
+    finally:
+      self._lock.release()
+    ret = self._responses[relpath]
+    if isinstance(ret, Exception):
+      raise ret
+    return ret
+
+class RejectingResource(PathMockResource):
+  """
+  Fails requests carrying the given header value with the given HTTP error.
+  """
+
+  def __init__(self, test, responses, header, value, code=415):
+    PathMockResource.__init__(self, test, responses)
+    self._header = header
+    self._value = value
+    self._code = code
+
+  def invoke(self, method, relpath=None, params=None, data=None, headers=None):
+    ret = PathMockResource.invoke(self, method, relpath, params, data, headers)
+    if headers and headers.get(self._header) == self._value:
+      raise RestException(urllib2.HTTPError(relpath, self._code, 'Error',
+          None, StringIO('')))
+    return ret
+
+class TestRoleConfigGroups(unittest.TestCase):
+
+  def __init__(self, methodName):
+    unittest.TestCase.__init__(self, methodName)
+    self.resource = utils.MockResource(self)
+
+  def _group_json(self, name, role_type='DATANODE'):
+    return {
+      'name' : name,
+      'displayName' : name,
+      'roleType' : role_type,
+      'base' : False,
+      'serviceRef' : { 'clusterName' : 'c1', 'serviceName' : 'hdfs1' },
+    }
+
+  def test_create_role_config_groups(self):
+    groups = [
+      ApiRoleConfigGroup(self.resource, 'g1', 'G1', 'DATANODE'),
+      ApiRoleConfigGroup(self.resource, 'g2', 'G2', 'NAMENODE'),
+    ]
+    self.resource.expect('POST', '/clusters/c1/services/hdfs1/roleConfigGroups',
+        data=groups,
+        retdata={ 'items' : [ self._group_json('g1'),
+                              self._group_json('g2', 'NAMENODE') ] })
+    ret = create_role_config_groups(self.resource, 'hdfs1', groups, 'c1')
+    self.assertEqual(2, len(ret))
+    self.assertEqual('g1', ret[0].name)
+    self.assertEqual('NAMENODE', ret[1].roleType)
+    self.assertEqual('hdfs1', ret[1].serviceRef.serviceName)
+
+  def test_create_role_config_group(self):
+    expected = ApiRoleConfigGroup(self.resource, 'g1', 'G1', 'DATANODE')
+    self.resource.expect('POST', '/clusters/c1/services/hdfs1/roleConfigGroups',
+        data=[ expected ],
+        retdata={ 'items' : [ self._group_json('g1') ] })
+    ret = create_role_config_group(self.resource, 'hdfs1', 'g1', 'G1',
+        'DATANODE', 'c1')
+    self.assertEqual('g1', ret.name)
+    self.assertEqual('c1', ret.serviceRef.clusterName)
+
+  def test_update_role_config_group(self):
+    group = ApiRoleConfigGroup(self.resource, 'g1', 'New name', 'DATANODE')
+    self.resource.expect('PUT',
+        '/clusters/c1/services/hdfs1/roleConfigGroups/g1',
+        data=group,
+        retdata=self._group_json('g1'))
+    ret = update_role_config_group(self.resource, 'hdfs1', 'g1', group, 'c1')
+    self.assertEqual('g1', ret.name)
+
+  def test_move_roles(self):
+    roles = [ 'role1', 'role2' ]
+    self.resource.expect('PUT',
+        '/clusters/c1/services/hdfs1/roleConfigGroups/g1/roles',
+        data=roles,
+        retdata=ApiList([ ApiRole(self.resource, name=x) for x in roles ])
+            .to_json_dict())
+    ret = move_roles(self.resource, 'hdfs1', 'g1', roles, 'c1')
+    self.assertEqual(roles, [ r.name for r in ret ])
+
+    self.resource.expect('PUT',
+        '/cm/service/roleConfigGroups/roles',
+        data=roles,
+        retdata=ApiList([ ApiRole(self.resource, name=x) for x in roles ])
+            .to_json_dict())
+    ret = move_roles_to_base_role_config_group(self.resource, 'mgmt',
+        iter(roles), None)
+    self.assertEqual(2, len(ret))
+
+  def test_empty_bulk_calls(self):
+    # No request is expected; MockResource would fail on an unexpected call.
+    self.assertEqual(0, len(create_role_config_groups(self.resource, 'hdfs1',
+        [], 'c1')))
+    self.assertEqual(0, len(move_roles(self.resource, 'hdfs1', 'g1', iter([]),
+        'c1')))
+    self.assertEqual(0, len(move_roles_to_base_role_config_group(
+        self.resource, 'hdfs1', [], 'c1')))
+
+  def test_move_roles_bulk(self):
+    path = '/clusters/c1/services/hdfs1/roleConfigGroups/%s/roles'
+    resource = PathMockResource(self, {
+      path % 'g1' : ApiList([ ApiRole(self.resource, name='r1') ])
+          .to_json_dict(),
+      path % 'g2' : ApiList([ ApiRole(self.resource, name='r2'),
+                              ApiRole(self.resource, name='r3') ])
+          .to_json_dict(),
+    })
+    moves = [ ('g1', [ 'r1' ]), ('g2', [ 'r2', 'r3' ]) ]
+    ret = move_roles_bulk(resource, 'hdfs1', moves, 'c1', max_workers=2)
+    self.assertEqual([ 'r1', 'r2', 'r3' ], [ r.name for r in ret ])
+    self.assertEqual(2, len(resource.requests))
+    self.assertEqual(0, len(move_roles_bulk(resource, 'hdfs1', { }, 'c1')))
+
+    ret = move_roles_bulk(resource, 'hdfs1', moves, 'c1', max_workers=1)
+    self.assertEqual([ 'r1', 'r2', 'r3' ], [ r.name for r in ret ])
+    self.assertRaises(ValueError, move_roles_bulk, resource, 'hdfs1', moves,
+        'c1', max_workers=0)
+
+  def test_move_roles_bulk_partial_failure(self):
+    path = '/clusters/c1/services/hdfs1/roleConfigGroups/%s/roles'
+    resource = PathMockResource(self, {
+      path % 'g1' : ApiList([ ApiRole(self.resource, name='r1') ])
+          .to_json_dict(),
+      path % 'g2' : RestException(urllib2.HTTPError(path % 'g2', 400, 'Error',
+          None, StringIO(''))),
+    })
+    moves = [ ('g1', [ 'r1' ]), ('g2', [ 'r2' ]) ]
+    for workers in (1, 2):
+      try:
+        move_roles_bulk(resource, 'hdfs1', moves, 'c1', max_workers=workers)
+        self.fail("Expected a MoveRolesBulkError")
+      except MoveRolesBulkError, ex:
+        self.assertEqual([ 'g1' ], ex.moved.keys())
+        self.assertEqual([ 'r1' ], [ r.name for r in ex.moved['g1'] ])
+        self.assertEqual([ 'g2' ], ex.errors.keys())
+        self.assertEqual(400, ex.errors['g2'].code)
+
+  def test_gzip_bodies(self):
+    path = '/clusters/c1/services/hdfs1/roleConfigGroups/g1/roles'
+    resource = PathMockResource(self, { path : ApiList([ ]).to_json_dict() })
+    roles = [ 'role-%04d' % (i,) for i in xrange(500) ]
+    expected = json.dumps(ApiList(roles).to_json_dict())
+
+    # Not compressed until the server is known to support gzip.
+    move_roles(resource, 'hdfs1', 'g1', roles, 'c1')
+    self.assertEqual(expected, resource.requests[-1][2])
+    self.assertEqual(None, resource.requests[-1][3])
+
+    resource.supports_gzip = True
+    move_roles(resource, 'hdfs1', 'g1', roles, 'c1')
+    method, relpath, data, headers = resource.requests[-1]
+    self.assertEqual({ 'Content-Encoding' : 'gzip' }, headers)
+    self.assertEqual(expected, gzip.GzipFile(fileobj=StringIO(data)).read())
+
+    # Small bodies are always sent as-is.
+    move_roles(resource, 'hdfs1', 'g1', roles[:2], 'c1')
+    self.assertEqual(None, resource.requests[-1][3])
+
+  def test_gzip_bodies_rejected(self):
+    path = '/clusters/c1/services/hdfs1/roleConfigGroups/g1/roles'
+    resource = RejectingResource(self, { path : ApiList([ ]).to_json_dict() },
+        'Content-Encoding', 'gzip')
+    resource.supports_gzip = True
+    roles = [ 'role-%04d' % (i,) for i in xrange(500) ]
+
+    # The compressed body is rejected, and resent uncompressed.
+    move_roles(resource, 'hdfs1', 'g1', roles, 'c1')
+    self.assertEqual([ { 'Content-Encoding' : 'gzip' }, None ],
+        [ r[3] for r in resource.requests ])
+    self.assertFalse(resource.supports_gzip)
+
+    move_roles(resource, 'hdfs1', 'g1', roles, 'c1')
+    self.assertEqual(3, len(resource.requests))
+    self.assertEqual(None, resource.requests[-1][3])
+
+  def test_gzip_bodies_other_error(self):
+    path = '/clusters/c1/services/hdfs1/roleConfigGroups/g1/roles'
+    resource = RejectingResource(self, { path : ApiList([ ]).to_json_dict() },
+        'Content-Encoding', 'gzip', code=400)
+    resource.supports_gzip = True
+    roles = [ 'role-%04d' % (i,) for i in xrange(500) ]
+
+    # Errors other than 415 are not about the encoding; nothing is resent.
+    try:
+      move_roles(resource, 'hdfs1', 'g1', roles, 'c1')
+      self.fail("Expected a RestException")
+    except RestException, ex:
+      self.assertEqual(400, ex.code)
+    self.assertEqual(1, len(resource.requests))
+    self.assertTrue(resource.supports_gzip)
+
+  def test_gzip_response_does_not_enable_gzip_bodies(self):
+    class Client(object):
+      logger = logging.getLogger(__name__)
+      def execute(self, method, path, params=None, data=None, headers=None):
+        hdrs = mimetools.Message(StringIO('Content-Type: application/json\r\n'
+            'Content-Encoding: gzip\r\n\r\n'))
+        return urllib.addinfourl(StringIO('{}'), hdrs, path, 200)
+
+    resource = Resource(Client())
+    self.assertEqual({ }, resource.get('/cm/version'))
+    self.assertFalse(resource.supports_gzip)
+
+  def test_get_all_role_config_groups(self):
+    self.resource.expect('GET', '/clusters/c1/services/hdfs1/roleConfigGroups',
+        retdata={ 'items' : [ self._group_json('g1'), self._group_json('g2') ] })
+    ret = get_all_role_config_groups(self.resource, 'hdfs1', 'c1')
+    self.assertEqual([ 'g1', 'g2' ], [ g.name for g in ret ])
+
+  def test_get_role_config_group(self):
+    self.resource.expect('GET',
+        '/clusters/c1/services/hdfs1/roleConfigGroups/g1',
+        retdata=self._group_json('g1'))
+    ret = get_role_config_group(self.resource, 'hdfs1', 'g1', 'c1')
+    self.assertEqual('g1', ret.name)
+
+    self.resource.expect('GET', '/cm/service/roleConfigGroups/g2',
+        retdata=self._group_json('g2'))
+    ret = get_role_config_group(self.resource, 'mgmt', 'g2', None)
+    self.assertEqual('g2', ret.name)
+
+  def test_get_all_role_config_groups_fast(self):
+    g1 = self._group_json('g1')
+    g1['config'] = { 'items' : [ { 'name' : 'foo', 'value' : 'bar' } ] }
+    self.resource.expect('GET', '/clusters/c1/services/hdfs1/roleConfigGroups',
+        retdata={ 'items' : [ g1, self._group_json('g2') ] })
+    ret = get_all_role_config_groups_fast(self.resource, 'hdfs1', 'c1')
+    self.assertEqual(2, len(ret))
+    for fast, raw in zip(ret, [ g1, self._group_json('g2') ]):
+      strict = ApiRoleConfigGroup.from_json_dict(raw, self.resource)
+      for name in ('name', 'displayName', 'roleType', 'base'):
+        self.assertEqual(getattr(strict, name), getattr(fast, name))
+      self.assertEqual(strict.serviceRef.to_json_dict(),
+          fast.serviceRef.to_json_dict())
+    self.assertEqual([ 'foo' ], ret[0].config.keys())
+    self.assertEqual('bar', ret[0].config['foo'].value)
+    self.assertEqual(None, ret[1].config)
+
+    g1['unknown'] = True
+    self.assertRaises(AttributeError, ApiRoleConfigGroup.from_json_dict_fast,
+        g1, self.resource)
+
+  def test_iter_all_role_config_groups(self):
+    self.resource.expect('GET', '/clusters/c1/services/hdfs1/roleConfigGroups',
+        retdata={ 'items' : [ self._group_json('g1'), self._group_json('g2') ] })
+    ret = iter_all_role_config_groups(self.resource, 'hdfs1', 'c1')
+    self.assertEqual('g1', ret.next().name)
+    self.assertEqual('g2', ret.next().name)
+    self.assertRaises(StopIteration, ret.next)
+
+    old_api = utils.MockResource(self, version=2)
+    self.assertRaises(Exception, iter_all_role_config_groups, old_api,
+        'hdfs1', 'c1')
+
+  def test_get_role_config_groups(self):
+    self.resource.expect('GET', '/clusters/c1/services/hdfs1/roleConfigGroups',
+        retdata={ 'items' : [ self._group_json('g1'), self._group_json('g2'),
+                              self._group_json('g3') ] })
+    ret = get_role_config_groups(self.resource, 'hdfs1', [ 'g3', 'g1' ], 'c1')
+    self.assertEqual([ 'g3', 'g1' ], [ g.name for g in ret ])
+
+    self.resource.expect('GET', '/clusters/c1/services/hdfs1/roleConfigGroups',
+        retdata={ 'items' : [ self._group_json('g1') ] })
+    self.assertRaises(KeyError, get_role_config_groups, self.resource,
+        'hdfs1', [ 'g2' ], 'c1')
+
+  def test_config(self):
+    group = ApiRoleConfigGroup.from_json_dict(self._group_json('g1'),
+        self.resource)
+    cfg = { 'items' : [ { 'name' : 'dfs_data_dir_list', 'value' : '/data' } ] }
+
+    self.resource.expect('GET',
+        '/clusters/c1/services/hdfs1/roleConfigGroups/g1/config',
+        params={ 'view' : 'summary' },
+        retdata=cfg)
+    ret = group.get_config(view='summary')
+    self.assertEqual({ 'dfs_data_dir_list' : '/data' }, ret)
+
+    self.resource.expect('PUT',
+        '/clusters/c1/services/hdfs1/roleConfigGroups/g1/config',
+        data=config_to_json({ 'dfs_data_dir_list' : '/data' }),
+        retdata=cfg)
+    ret = group.update_config({ 'dfs_data_dir_list' : '/data' })
+    self.assertEqual({ 'dfs_data_dir_list' : '/data' }, ret)
+
+  @unittest.skipIf(role_config_groups.cbor2 is None, "cbor2 is not installed")
+  def test_update_config_cbor(self):
+    cbor2 = role_config_groups.cbor2
+    group = ApiRoleConfigGroup.from_json_dict(self._group_json('g1'),
+        self.resource)
+    config = { 'dfs_data_dir_list' : '/data' }
+    cfg = { 'items' : [ { 'name' : 'dfs_data_dir_list', 'value' : '/data' } ] }
+    accept = 'application/cbor, application/json;q=0.9'
+
+    # Unless the caller enables CBOR, the payload is JSON.
+    self.resource.expect('PUT',
+        '/clusters/c1/services/hdfs1/roleConfigGroups/g1/config',
+        data=config_to_json(config),
+        headers={ 'Accept' : accept },
+        retdata=cfg)
+    self.assertEqual(config, group.update_config(config))
+
+    self.resource.supports_cbor = True
+    self.resource.expect('PUT',
+        '/clusters/c1/services/hdfs1/roleConfigGroups/g1/config',
+        data=cbor2.dumps(cfg),
+        headers={ 'Accept' : accept, 'Content-Type' : 'application/cbor' },
+        retdata=cfg)
+    self.assertEqual(config, group.update_config(config))
+
+  @unittest.skipIf(role_config_groups.cbor2 is None, "cbor2 is not installed")
+  def test_update_config_cbor_rejected(self):
+    path = '/clusters/c1/services/hdfs1/roleConfigGroups/g1/config'
+    cfg = { 'items' : [ { 'name' : 'dfs_data_dir_list', 'value' : '/data' } ] }
+    resource = RejectingResource(self, { path : cfg }, 'Content-Type',
+        'application/cbor')
+    resource.supports_cbor = True
+    group = ApiRoleConfigGroup.from_json_dict(self._group_json('g1'), resource)
+    config = { 'dfs_data_dir_list' : '/data' }
+
+    # The CBOR body is rejected, and resent as JSON.
+    self.assertEqual(config, group.update_config(config))
+    self.assertEqual([ role_config_groups.cbor2.dumps(cfg),
+        config_to_json(config) ], [ r[2] for r in resource.requests ])
+    self.assertFalse(resource.supports_cbor)
+
+    self.assertEqual(config, group.update_config(config))
+    self.assertEqual(config_to_json(config), resource.requests[-1][2])
+
+    # Other errors are not about the encoding; nothing is resent.
+    resource = RejectingResource(self, { path : cfg }, 'Content-Type',
+        'application/cbor', code=400)
+    resource.supports_cbor = True
+    group = ApiRoleConfigGroup.from_json_dict(self._group_json('g1'), resource)
+    self.assertRaises(RestException, group.update_config, config)
+    self.assertEqual(1, len(resource.requests))
+    self.assertTrue(resource.supports_cbor)
+
+  @unittest.skipIf(role_config_groups.cbor2 is None, "cbor2 is not installed")
+  def test_get_config_cbor(self):
+    group = ApiRoleConfigGroup.from_json_dict(self._group_json('g1'),
+        self.resource)
+    cfg = { 'items' : [ { 'name' : 'dfs_data_dir_list', 'value' : '/data',
+                          'required' : False, 'sensitive' : False } ] }
+
+    # The full view asks for CBOR; the resource decodes either format.
+    self.resource.expect('GET',
+        '/clusters/c1/services/hdfs1/roleConfigGroups/g1/config',
+        params={ 'view' : 'full' },
+        headers={ 'Accept' : 'application/cbor, application/json;q=0.9' },
+        retdata=cfg)
+    ret = group.get_config(view='full')
+    self.assertEqual([ 'dfs_data_dir_list' ], ret.keys())
+    self.assertEqual('/data', ret['dfs_data_dir_list'].value)
+
+if __name__ == '__main__':
+  unittest.main()